@@ -1,302 +1,518 @@
-#!/usr/bin/env python3
-"""
-PullBackInTW_balanced.py
-Balanced preset for Pullback Buy (平衡設定)
-- Default TICKER = "2317.TW"
-- Usage: python PullBackInTW_balanced.py --ticker 2317.TW
-- Requirements: pip install yfinance pandas numpy twstock
-"""
-
-import argparse
-import re
-from datetime import datetime
-
-import numpy as np
-import pandas as pd
-import yfinance as yf
-
-# -------- Strategy parameters (Balanced preset) --------
-RSI_PERIOD = 14
-SMA_SHORT = 20
-SMA_MID = 50
-SMA_LONG = 200
-VOL_SMA = 20
-
-PULLBACK_NDAYS = 10      # 用最近 N 日高點計算拉回
-PULLBACK_PCT = 0.07      # 距離近期高點下跌 >= 7% 視為拉回
-VOL_MIN_RATIO_ENTRY = 0.8    # 初次進場允許量 >= 0.8 * 20日均量
-VOL_MIN_RATIO_CONFIRM = 1.2  # 回彈確認要求量 >= 1.2 * 20日均量
-
-SL_BUFFER_PCT = 0.015    # 停損緩衝 1.5%
-
-# -------- Helpers for company name --------
-def contains_cjk(s: str) -> bool:
-    return bool(s and re.search('[\u4e00-\u9fff]', s))
-
-def get_company_name_from_twstock(code_str):
-    try:
-        import twstock
-    except Exception:
-        return None
-    m = re.search(r'(\d+)', code_str)
-    if not m:
-        return None
-    code = m.group(1)
-    info = twstock.codes.get(code)
-    if info and hasattr(info, 'name'):
-        return info.name
-    return None
-
-def get_company_name(ticker):
-    # 1) try twstock (offline Taiwan mapping)
-    name = get_company_name_from_twstock(ticker)
-    if name:
-        return name
-    # 2) fallback to yfinance info
-    try:
-        tk = yf.Ticker(ticker)
-        info = tk.info or {}
-        for k in ("shortName", "longName", "name"):
-            v = info.get(k)
-            if v and isinstance(v, str):
-                if contains_cjk(v):
-                    return v
-                else:
-                    fallback = v
-        if 'fallback' in locals():
-            return f"{fallback} (英文名稱)"
-    except Exception:
-        pass
-    return ticker
-
-# -------- Indicator calculations (Wilder RSI = EWM with alpha=1/n) --------
-def calc_sma(series: pd.Series, n: int):
-    return series.rolling(n).mean()
-
-def calc_rsi_wilder(close: pd.Series, n: int = 14):
-    delta = close.diff()
-    up = delta.clip(lower=0)
-    down = -delta.clip(upper=0)
-    avg_gain = up.ewm(alpha=1/n, adjust=False).mean()
-    avg_loss = down.ewm(alpha=1/n, adjust=False).mean()
-    rs = avg_gain / avg_loss.replace(0, np.nan)
-    rsi = 100 - (100 / (1 + rs))
-    rsi = rsi.fillna(50)
-    return rsi
-
-def calc_macd(close: pd.Series, fast=12, slow=26, signal=9):
-    ema_fast = close.ewm(span=fast, adjust=False).mean()
-    ema_slow = close.ewm(span=slow, adjust=False).mean()
-    macd = ema_fast - ema_slow
-    macd_sig = macd.ewm(span=signal, adjust=False).mean()
-    macd_hist = macd - macd_sig
-    return macd, macd_sig, macd_hist
-
-# -------- Data fetch and prepare --------
-def fetch_data(ticker: str, days: int = 400):
-    # Use yfinance history; auto_adjust=False to use raw prices
-    tk = yf.Ticker(ticker)
-    df = tk.history(period=f"{days}d", interval="1d", auto_adjust=False)
-    if df is None or df.empty:
-        raise RuntimeError(f"取得 {ticker} 資料失敗，請確認代號或網路。")
-    df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
-    df.index = pd.to_datetime(df.index)
-    return df
-
-def prepare_df(df: pd.DataFrame):
-    df = df.copy()
-    df[f"SMA{SMA_SHORT}"] = calc_sma(df['Close'], SMA_SHORT)
-    df[f"SMA{SMA_MID}"] = calc_sma(df['Close'], SMA_MID)
-    df[f"SMA{SMA_LONG}"] = calc_sma(df['Close'], SMA_LONG)
-    df[f"RSI{RSI_PERIOD}"] = calc_rsi_wilder(df['Close'], RSI_PERIOD)
-    macd, macd_sig, macd_hist = calc_macd(df['Close'])
-    df["MACD"] = macd
-    df["MACD_SIG"] = macd_sig
-    df["MACD_HIST"] = macd_hist
-    df["VOL_SMA"] = df["Volume"].rolling(VOL_SMA).mean()
-    return df
-
-# -------- Decision logic: Balanced preset --------
-def decision_pullback_balanced(df: pd.DataFrame):
-    latest = df.iloc[-1]
-    prev = df.iloc[-2]
-
-    close = float(latest['Close'])
-    low = float(latest['Low'])
-    high = float(latest['High'])
-    vol = float(latest['Volume'])
-
-    sma20 = float(latest[f"SMA{SMA_SHORT}"]) if not pd.isna(latest[f"SMA{SMA_SHORT}"]) else np.nan
-    sma50 = float(latest[f"SMA{SMA_MID}"]) if not pd.isna(latest[f"SMA{SMA_MID}"]) else np.nan
-    sma200 = float(latest[f"SMA{SMA_LONG}"]) if not pd.isna(latest[f"SMA{SMA_LONG}"]) else np.nan
-    rsi = float(latest[f"RSI{RSI_PERIOD}"])
-    rsi_prev = float(prev[f"RSI{RSI_PERIOD}"])
-    macd = float(latest["MACD"])
-    macd_sig = float(latest["MACD_SIG"])
-    macd_hist = float(latest["MACD_HIST"])
-    vol20 = float(latest["VOL_SMA"]) if not pd.isna(latest["VOL_SMA"]) else np.nan
-
-    recent_high = float(df['High'].iloc[-PULLBACK_NDAYS:].max())
-    recent_low = float(df['Low'].iloc[-PULLBACK_NDAYS:].min())
-    drop_from_high = (recent_high - low) / recent_high if (recent_high and recent_high > 0) else 0.0
-
-    reasons = []
-    flags = {}
-
-    # Trend: SMA50 > SMA200 AND Close > SMA50
-    trend_ok = False
-    if not np.isnan(sma50) and not np.isnan(sma200):
-        trend_ok = (sma50 > sma200) and (close > sma50)
-    flags['trend_ok'] = trend_ok
-    reasons.append("📈 長期趨勢：SMA50>{:.2f} & Close>{:.2f} → {}".format(sma200, sma50, "✅" if trend_ok else "🔻"))
-
-    # Pullback detection: hit SMA20 OR drop >= PULLBACK_PCT
-    pullback_by_sma20 = (not np.isnan(sma20)) and (low <= sma20)
-    pullback_by_pct = drop_from_high >= PULLBACK_PCT
-    flags['pullback_by_sma20'] = pullback_by_sma20
-    flags['pullback_by_pct'] = pullback_by_pct
-    if pullback_by_sma20:
-        reasons.append(f"🔻 發生拉回：價格觸及/跌破 SMA{SMA_SHORT}（Low {low:.2f} <= SMA{SMA_SHORT} {sma20:.2f}）")
-    elif pullback_by_pct:
-        reasons.append(f"🔻 發生拉回：距離最近 {PULLBACK_NDAYS} 日高點下跌 {drop_from_high*100:.2f}% ≥ {PULLBACK_PCT*100:.1f}%")
-    else:
-        reasons.append("ℹ️ 近期未發現合格拉回（未觸及 SMA20 且跌幅不足）")
-
-    # RSI condition: between 30~50 and rising OR crossing 30/40 upward
-    rsi_ok = False
-    if (30 <= rsi <= 50 and rsi > rsi_prev) or ((rsi_prev < 30 and rsi >= 30) or (rsi_prev < 40 and rsi >= 40)):
-        rsi_ok = True
-    flags['rsi_ok'] = rsi_ok
-    reasons.append(f"🔍 RSI: now {rsi:.2f}, prev {rsi_prev:.2f} → {'✅' if rsi_ok else '🔻'}")
-
-    # MACD: hist rising or macd > signal
-    prev_hist = float(df["MACD_HIST"].iloc[-2])
-    macd_ok = False
-    if (macd_hist > prev_hist and macd_hist > 0) or (macd > macd_sig):
-        macd_ok = True
-    flags['macd_ok'] = macd_ok
-    reasons.append(f"📊 MACD_HIST: now {macd_hist:.6f}, prev {prev_hist:.6f} → {'✅' if macd_ok else '🔻'}")
-
-    # Volume: entry-level allow 0.8*20davg, confirmation requires 1.2*20davg
-    vol_entry_ok = (not np.isnan(vol20)) and (vol >= VOL_MIN_RATIO_ENTRY * vol20)
-    vol_confirm_ok = (not np.isnan(vol20)) and (vol >= VOL_MIN_RATIO_CONFIRM * vol20)
-    flags['vol_entry_ok'] = vol_entry_ok
-    flags['vol_confirm_ok'] = vol_confirm_ok
-    reasons.append(f"📈 量能：今日 {int(vol)} / 20d avg {int(vol20) if not np.isnan(vol20) else 'N/A'} → entry_ok={'✅' if vol_entry_ok else '🔴'}, confirm_ok={'✅' if vol_confirm_ok else '🔴'}")
-
-    # Final decision logic for Balanced:
-    # require: trend_ok AND (pullback_by_sma20 OR pullback_by_pct) AND (rsi_ok OR macd_ok) AND vol_entry_ok
-    entry = False
-    if trend_ok and (pullback_by_sma20 or pullback_by_pct) and (rsi_ok or macd_ok) and vol_entry_ok:
-        entry = True
-    flags['entry'] = entry
-
-    # Suggested buy zone & stop loss (conservative)
-    buy_zone = None
-    buy_break = None
-    stop_loss = None
-    if pullback_by_sma20 and not np.isnan(sma20):
-        # conservative zone between SMA20*0.99 and max(close,sma20)
-        low_zone = max(recent_low, sma20 * 0.98)
-        high_zone = max(close, sma20)
-        buy_zone = (low_zone, high_zone)
-        stop_loss = recent_low * (1 - SL_BUFFER_PCT)
-    elif pullback_by_pct:
-        buy_zone = (recent_low, (recent_high + recent_low) / 2.0)
-        stop_loss = recent_low * (1 - SL_BUFFER_PCT)
-    else:
-        # no clear pullback -> optional breakout entry
-        buy_break = high * 1.002
-        stop_loss = recent_low * (1 - SL_BUFFER_PCT)
-
-    # Collect values for printing / logging
-    values = {
-        "close": close,
-        "low": low,
-        "high": high,
-        "volume": vol,
-        "SMA20": sma20,
-        "SMA50": sma50,
-        "SMA200": sma200,
-        "RSI": rsi,
-        "RSI_prev": rsi_prev,
-        "MACD": macd,
-        "MACD_SIG": macd_sig,
-        "MACD_HIST": macd_hist,
-        "VOL20": vol20,
-        "recent_high": recent_high,
-        "recent_low": recent_low,
-        "drop_from_high_pct": drop_from_high * 100,
-    }
-
-    plan = {
-        "buy_zone": buy_zone,
-        "buy_break": buy_break,
-        "stop_loss": stop_loss,
-        "vol_entry_ok": vol_entry_ok,
-        "vol_confirm_ok": vol_confirm_ok,
-        "sl_buffer_pct": SL_BUFFER_PCT,
-    }
-
-    return {"entry": entry, "reasons": reasons, "flags": flags, "values": values, "plan": plan}
-
-# -------- Pretty print (emoji-friendly) --------
-def pretty_print(result: dict, ticker: str, company_name: str):
-    vals = result["values"]
-    plan = result["plan"]
-    print("=======================================================")
-    print(f"🕒 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"📌 標的：{ticker}  —  {company_name}")
-    print("-------------------------------------------------------")
-    print(f"💰 今日收盤：{vals['close']:.2f}    🔽 今日最低：{vals['low']:.2f}    🔼 今日最高：{vals['high']:.2f}")
-    print(f"📈 今日成交量：{int(vals['volume'])}    （20日平均量：{int(vals['VOL20']) if not np.isnan(vals['VOL20']) else 'N/A'}）")
-    print("-------------------------------------------------------")
-    print(f"📊 SMA{SMA_SHORT}：{vals['SMA20']:.2f}    SMA{SMA_MID}：{vals['SMA50']:.2f}    SMA{SMA_LONG}：{vals['SMA200']:.2f}")
-    print(f"📉 RSI{RSI_PERIOD}：{vals['RSI']:.2f}（前：{vals['RSI_prev']:.2f}）")
-    print(f"📈 MACD：{vals['MACD']:.4f}    SIG：{vals['MACD_SIG']:.4f}    HIST：{vals['MACD_HIST']:.6f}")
-    print("-------------------------------------------------------")
-    print(f"📅 最近 {PULLBACK_NDAYS} 日高點：{vals['recent_high']:.2f}    低點：{vals['recent_low']:.2f}")
-    print(f"🔻 距離最近高點跌幅：{vals['drop_from_high_pct']:.2f}%")
-    print("=======================================================")
-    print("🔎 判斷結果（Balanced preset）：")
-    print(" ➤ 是否為合格拉回買：", "✅ ✅ ✅ 合格（可考慮分批進場）" if result["entry"] else "❌ ❌ ❌ 不建議拉回買（不符條件）")
-    print("\n📝 觸發/檢核細項：")
-    for r in result["reasons"]:
-        print("  -", r)
-    print("\n🎯 建議進場計畫（僅供參考）：")
-    if plan["buy_zone"] is not None:
-        lo, hi = plan["buy_zone"]
-        print(f"  🟢 建議分批買入區間（保守參考）：{lo:.2f} ~ {hi:.2f}")
-    if plan["buy_break"] is not None:
-        print(f"  🔵 或等突破買進（突破當日高點）：{plan['buy_break']:.2f}")
-    if plan["stop_loss"] is not None:
-        print(f"  🛑 建議停損：{plan['stop_loss']:.2f}（最近 {PULLBACK_NDAYS} 日低點下方 {plan.get('sl_buffer_pct')*100:.2f}%）")
-    print("-------------------------------------------------------")
-    print("💡 小建議：首次進場建議分批（例如 40% / 30% / 30%），回彈放量再加碼。")
-    print("=======================================================")
-
-# -------- Main --------
-def main():
-    parser = argparse.ArgumentParser(description="PullBackInTW (Balanced preset)")
-    parser.add_argument("--ticker", type=str, default="2317.TW", help="Ticker (e.g., 2317.TW or NVDA)")
-    parser.add_argument("--days", type=int, default=400, help="Days history to fetch")
-    args = parser.parse_args()
-
-    ticker = args.ticker
-    days = args.days
-
-    df = fetch_data(ticker, days)
-    df = prepare_df(df)
-    if df.shape[0] < max(SMA_LONG, RSI_PERIOD, VOL_SMA, PULLBACK_NDAYS) + 5:
-        raise RuntimeError("資料筆數不足，請增加 days 或確認資料來源。")
-
-    result = decision_pullback_balanced(df)
-    company_name = get_company_name(ticker)
-    pretty_print(result, ticker, company_name)
-
-if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        print("執行發生錯誤：", e)
-        print("檢查：是否安裝 yfinance/pandas/numpy (twstock 可選)、或 ticker 格式是否正確（TW 市場加 .TW）")
+#!/usr/bin/env python3
+"""
+PullBackInTW_balanced.py
+Balanced preset for Pullback Buy (平衡設定)
+- Default TICKER = "2317.TW"
+- Usage: python PullBackInTW_balanced.py --ticker 2317.TW
+- Requirements: pip install yfinance pandas numpy twstock
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import math
+import os
+import pickle
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# yfinance 很重（requests/lxml 連鎖 import，數百 ms），延後到真正要打
+# 網路的函式內才載入，讓 --help 與快取命中的暖啟動不用付這筆成本。
+
+# -------- Strategy parameters (Balanced preset) --------
+RSI_PERIOD = 14
+SMA_SHORT = 20
+SMA_MID = 50
+SMA_LONG = 200
+VOL_SMA = 20
+
+PULLBACK_NDAYS = 10      # 用最近 N 日高點計算拉回
+PULLBACK_PCT = 0.07      # 距離近期高點下跌 >= 7% 視為拉回
+VOL_MIN_RATIO_ENTRY = 0.8    # 初次進場允許量 >= 0.8 * 20日均量
+VOL_MIN_RATIO_CONFIRM = 1.2  # 回彈確認要求量 >= 1.2 * 20日均量
+
+SL_BUFFER_PCT = 0.015    # 停損緩衝 1.5%
+
+# -------- Helpers for company name --------
+_CJK_RE = re.compile('[\u4e00-\u9fff]')
+_CODE_RE = re.compile(r'(\d+)')
+
+def contains_cjk(s: str) -> bool:
+    if not s:
+        return False
+    # 公司名多半只有幾個字，直接掃碼位就好；長字串才交給 C 實作的 regex
+    if len(s) <= 16:
+        return any('\u4e00' <= ch <= '\u9fff' for ch in s)
+    return _CJK_RE.search(s) is not None
+
+@functools.lru_cache(maxsize=2048)
+def get_company_name_from_twstock(code_str):
+    try:
+        import twstock
+    except Exception:
+        return None
+    m = _CODE_RE.search(code_str)
+    if not m:
+        return None
+    code = m.group(1)
+    info = twstock.codes.get(code)
+    if info and hasattr(info, 'name'):
+        return info.name
+    return None
+
+_NAME_CACHE_PATH = os.path.expanduser("~/.cache/pullback/names.json")
+
+def _load_name_cache():
+    try:
+        with open(_NAME_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_name_cache(names: dict):
+    try:
+        os.makedirs(os.path.dirname(_NAME_CACHE_PATH), exist_ok=True)
+        with open(_NAME_CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(names, f, ensure_ascii=False)
+    except Exception:
+        pass
+
+@functools.lru_cache(maxsize=2048)
+def get_company_name(ticker):
+    # 0) 公司名稱不會變，查過一次就存在本地 JSON，之後免網路
+    names = _load_name_cache()
+    if ticker in names:
+        return names[ticker]
+    # 1) try twstock (offline Taiwan mapping)
+    name = get_company_name_from_twstock(ticker)
+    if name:
+        names[ticker] = name
+        _save_name_cache(names)
+        return name
+    # 2) fallback to yfinance info
+    try:
+        import socket
+        import yfinance as yf
+        tk = yf.Ticker(ticker)
+        # .info 端點又重又偶爾很慢；限 3 秒逾時，逾時就拿代號頂替，
+        # 不讓名稱查詢拖住主流程。新版 yfinance 的 get_info 可以只要
+        # 名稱欄位，不支援時才退回完整 .info。
+        old_timeout = socket.getdefaulttimeout()
+        socket.setdefaulttimeout(3)
+        try:
+            info = None
+            try:
+                info = tk.get_info(['shortName', 'longName'])
+            except Exception:
+                info = None
+            if not info:
+                info = tk.info or {}
+        finally:
+            socket.setdefaulttimeout(old_timeout)
+        for k in ("shortName", "longName", "name"):
+            v = info.get(k)
+            if v and isinstance(v, str):
+                if contains_cjk(v):
+                    names[ticker] = v
+                    _save_name_cache(names)
+                    return v
+                else:
+                    fallback = v
+        if 'fallback' in locals():
+            name = f"{fallback} (英文名稱)"
+            names[ticker] = name
+            _save_name_cache(names)
+            return name
+    except Exception:
+        pass
+    return ticker
+
+# -------- Indicators & data fetch (shared with main.py) --------
+# 指標核心、rolling max/min 與抓取/快取邏輯集中在 indicators.py，
+# 與 main.py 共用；calc_* 一併 re-export 維持本模組原本的公開介面。
+from indicators import (
+    CACHE_DIR, _compute_all, _indicators_kernel, _sma_multi,
+    calc_macd, calc_rsi_wilder, calc_sma,
+    fetch_data, fetch_data_many, rolling_max, rolling_min,
+)
+
+def prepare_df(df: pd.DataFrame, tail: int = SMA_LONG + 5):
+    # pandas 只留在 yfinance 邊界（取陣列、最後 assign 一次）；指標
+    # 全部在 ndarray / numba 核心上算，熱路徑不經過 pandas 的逐運算
+    # Block/finalize 開銷。換 Polars 等欄式引擎能得到的好處（平行
+    # 表達式、免 BlockManager）這裡已經用 numpy 拿到了，而且不多帶
+    # 一個必裝依賴。
+    # 決策只看最後兩根 K 棒（SMA200 需要 200 根歷史），更早的指標值
+    # 不會被讀到，所以只對尾段計算。EWM 類指標（RSI/MACD）在 200+ 根
+    # 之後早已收斂，從尾段重新起算的誤差可忽略。
+    if tail is not None and len(df) > tail:
+        df = df.tail(tail)
+    close = df['Close'].to_numpy()
+    volume = df['Volume'].to_numpy()
+    if _compute_all is not None:
+        sma_s, sma_m, sma_l, vol_sma, rsi, macd, macd_sig, macd_hist = _compute_all(
+            close, volume, SMA_SHORT, SMA_MID, SMA_LONG, VOL_SMA,
+            RSI_PERIOD, 12, 26, 9)
+    else:
+        sma_s, sma_m, sma_l = _sma_multi(close, (SMA_SHORT, SMA_MID, SMA_LONG))
+        vol_sma = _sma_multi(volume, (VOL_SMA,))[0]
+        rsi, macd, macd_sig, macd_hist = _indicators_kernel(
+            close, RSI_PERIOD, 12, 26, 9)
+    # 一次 assign 完成所有新欄位，避免逐欄觸發 BlockManager 重整；
+    # assign 本身會回傳新 frame，原本的 df.copy() 也省下來。
+    # 指標欄只拿來顯示與布林比較，float32 足夠，欄寬減半；
+    # 原始 OHLCV 維持 float64 以保住 diff/cumsum 的精度。
+    f32 = np.float32
+    return df.assign(**{
+        "RECENT_HIGH": rolling_max(df['High'].to_numpy(), PULLBACK_NDAYS).astype(f32),
+        "RECENT_LOW": rolling_min(df['Low'].to_numpy(), PULLBACK_NDAYS).astype(f32),
+        f"SMA{SMA_SHORT}": np.asarray(sma_s, dtype=f32),
+        f"SMA{SMA_MID}": np.asarray(sma_m, dtype=f32),
+        f"SMA{SMA_LONG}": np.asarray(sma_l, dtype=f32),
+        f"RSI{RSI_PERIOD}": np.asarray(rsi, dtype=f32),
+        "MACD": np.asarray(macd, dtype=f32),
+        "MACD_SIG": np.asarray(macd_sig, dtype=f32),
+        "MACD_HIST": np.asarray(macd_hist, dtype=f32),
+        "VOL_SMA": np.asarray(vol_sma, dtype=f32),
+    })
+
+# -------- Decision logic: Balanced preset --------
+# values/plan 用 slots dataclass 而非 dict：建構時不用配置雜湊表、
+# 不做字串 key 雜湊，pretty_print 端也改走屬性存取。
+@dataclass(slots=True)
+class Values:
+    close: float
+    low: float
+    high: float
+    volume: float
+    sma20: float
+    sma50: float
+    sma200: float
+    rsi: float
+    rsi_prev: float
+    macd: float
+    macd_sig: float
+    macd_hist: float
+    vol20: float
+    recent_high: float
+    recent_low: float
+    drop_from_high_pct: float
+
+@dataclass(slots=True)
+class Plan:
+    buy_zone: tuple = None
+    buy_break: float = None
+    stop_loss: float = None
+    vol_entry_ok: bool = False
+    vol_confirm_ok: bool = False
+    sl_buffer_pct: float = SL_BUFFER_PCT
+
+def decision_pullback_balanced(df: pd.DataFrame, verbose: bool = True):
+    # 直接取底層 ndarray 再做位置索引，避免 df.iloc[-1]/[-2] 各配置一個
+    # 混合 dtype 的 Series 加上十幾次逐鍵查找。
+    close_arr = df['Close'].to_numpy()
+    low_arr = df['Low'].to_numpy()
+    high_arr = df['High'].to_numpy()
+    vol_arr = df['Volume'].to_numpy()
+    rsi_arr = df[f"RSI{RSI_PERIOD}"].to_numpy()
+    hist_arr = df["MACD_HIST"].to_numpy()
+
+    close = float(close_arr[-1])
+    low = float(low_arr[-1])
+    high = float(high_arr[-1])
+    vol = float(vol_arr[-1])
+
+    sma20 = float(df[f"SMA{SMA_SHORT}"].to_numpy()[-1])
+    sma50 = float(df[f"SMA{SMA_MID}"].to_numpy()[-1])
+    sma200 = float(df[f"SMA{SMA_LONG}"].to_numpy()[-1])
+    rsi = float(rsi_arr[-1])
+    rsi_prev = float(rsi_arr[-2])
+    macd = float(df["MACD"].to_numpy()[-1])
+    macd_sig = float(df["MACD_SIG"].to_numpy()[-1])
+    macd_hist = float(hist_arr[-1])
+    vol20 = float(df["VOL_SMA"].to_numpy()[-1])
+
+    recent_high = float(df["RECENT_HIGH"].to_numpy()[-1])
+    recent_low = float(df["RECENT_LOW"].to_numpy()[-1])
+    drop_from_high = (recent_high - low) / recent_high if (recent_high and recent_high > 0) else 0.0
+
+    # Collect values for printing / logging
+    values = Values(
+        close=close, low=low, high=high, volume=vol,
+        sma20=sma20, sma50=sma50, sma200=sma200,
+        rsi=rsi, rsi_prev=rsi_prev,
+        macd=macd, macd_sig=macd_sig, macd_hist=macd_hist,
+        vol20=vol20, recent_high=recent_high, recent_low=recent_low,
+        drop_from_high_pct=drop_from_high * 100,
+    )
+
+    reasons = []
+    flags = {}
+
+    # Trend: SMA50 > SMA200 AND Close > SMA50
+    trend_ok = False
+    if not math.isnan(sma50) and not math.isnan(sma200):
+        trend_ok = (sma50 > sma200) and (close > sma50)
+    flags['trend_ok'] = trend_ok
+    if verbose:
+        reasons.append(("📈 長期趨勢：SMA50>{:.2f} & Close>{:.2f} → {}", (sma200, sma50, "✅" if trend_ok else "🔻")))
+
+    # Pullback detection: hit SMA20 OR drop >= PULLBACK_PCT
+    pullback_by_sma20 = (not math.isnan(sma20)) and (low <= sma20)
+    pullback_by_pct = drop_from_high >= PULLBACK_PCT
+    flags['pullback_by_sma20'] = pullback_by_sma20
+    flags['pullback_by_pct'] = pullback_by_pct
+    if verbose:
+        if pullback_by_sma20:
+            reasons.append(("🔻 發生拉回：價格觸及/跌破 SMA{0}（Low {1:.2f} <= SMA{0} {2:.2f}）", (SMA_SHORT, low, sma20)))
+        elif pullback_by_pct:
+            reasons.append(("🔻 發生拉回：距離最近 {} 日高點下跌 {:.2f}% ≥ {:.1f}%", (PULLBACK_NDAYS, drop_from_high * 100, PULLBACK_PCT * 100)))
+        else:
+            reasons.append(("ℹ️ 近期未發現合格拉回（未觸及 SMA20 且跌幅不足）", ()))
+
+    # 必要條件（趨勢 + 拉回）不成立時結果必為不進場；非 verbose（批次
+    # 掃描）路徑直接短路，省掉後面的子訊號與字串組裝。
+    if not verbose and not (trend_ok and (pullback_by_sma20 or pullback_by_pct)):
+        flags['entry'] = False
+        return {"entry": False, "reasons": reasons, "flags": flags,
+                "values": values, "plan": None}
+
+    # RSI condition: between 30~50 and rising OR crossing 30/40 upward
+    rsi_ok = False
+    if (30 <= rsi <= 50 and rsi > rsi_prev) or ((rsi_prev < 30 and rsi >= 30) or (rsi_prev < 40 and rsi >= 40)):
+        rsi_ok = True
+    flags['rsi_ok'] = rsi_ok
+    if verbose:
+        reasons.append(("🔍 RSI: now {:.2f}, prev {:.2f} → {}", (rsi, rsi_prev, "✅" if rsi_ok else "🔻")))
+
+    # MACD: hist rising or macd > signal
+    prev_hist = float(hist_arr[-2])
+    macd_ok = False
+    if (macd_hist > prev_hist and macd_hist > 0) or (macd > macd_sig):
+        macd_ok = True
+    flags['macd_ok'] = macd_ok
+    if verbose:
+        reasons.append(("📊 MACD_HIST: now {:.6f}, prev {:.6f} → {}", (macd_hist, prev_hist, "✅" if macd_ok else "🔻")))
+
+    # Volume: entry-level allow 0.8*20davg, confirmation requires 1.2*20davg
+    vol_entry_ok = (not math.isnan(vol20)) and (vol >= VOL_MIN_RATIO_ENTRY * vol20)
+    vol_confirm_ok = (not math.isnan(vol20)) and (vol >= VOL_MIN_RATIO_CONFIRM * vol20)
+    flags['vol_entry_ok'] = vol_entry_ok
+    flags['vol_confirm_ok'] = vol_confirm_ok
+    if verbose:
+        reasons.append(("📈 量能：今日 {} / 20d avg {} → entry_ok={}, confirm_ok={}",
+                        (int(vol), int(vol20) if not math.isnan(vol20) else 'N/A',
+                         "✅" if vol_entry_ok else "🔴", "✅" if vol_confirm_ok else "🔴")))
+
+    # Final decision logic for Balanced:
+    # require: trend_ok AND (pullback_by_sma20 OR pullback_by_pct) AND (rsi_ok OR macd_ok) AND vol_entry_ok
+    entry = False
+    if trend_ok and (pullback_by_sma20 or pullback_by_pct) and (rsi_ok or macd_ok) and vol_entry_ok:
+        entry = True
+    flags['entry'] = entry
+
+    # Suggested buy zone & stop loss (conservative)
+    buy_zone = None
+    buy_break = None
+    stop_loss = None
+    if pullback_by_sma20 and not math.isnan(sma20):
+        # conservative zone between SMA20*0.99 and max(close,sma20)
+        low_zone = max(recent_low, sma20 * 0.98)
+        high_zone = max(close, sma20)
+        buy_zone = (low_zone, high_zone)
+        stop_loss = recent_low * (1 - SL_BUFFER_PCT)
+    elif pullback_by_pct:
+        buy_zone = (recent_low, (recent_high + recent_low) / 2.0)
+        stop_loss = recent_low * (1 - SL_BUFFER_PCT)
+    else:
+        # no clear pullback -> optional breakout entry
+        buy_break = high * 1.002
+        stop_loss = recent_low * (1 - SL_BUFFER_PCT)
+
+    plan = Plan(
+        buy_zone=buy_zone, buy_break=buy_break, stop_loss=stop_loss,
+        vol_entry_ok=vol_entry_ok, vol_confirm_ok=vol_confirm_ok,
+    )
+
+    return {"entry": entry, "reasons": reasons, "flags": flags, "values": values, "plan": plan}
+
+# -------- Pretty print (emoji-friendly) --------
+def pretty_print(result: dict, ticker: str, company_name: str):
+    vals = result["values"]
+    plan = result["plan"]
+    print("=======================================================")
+    print(f"🕒 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📌 標的：{ticker}  —  {company_name}")
+    print("-------------------------------------------------------")
+    print(f"💰 今日收盤：{vals.close:.2f}    🔽 今日最低：{vals.low:.2f}    🔼 今日最高：{vals.high:.2f}")
+    print(f"📈 今日成交量：{int(vals.volume)}    （20日平均量：{int(vals.vol20) if not np.isnan(vals.vol20) else 'N/A'}）")
+    print("-------------------------------------------------------")
+    print(f"📊 SMA{SMA_SHORT}：{vals.sma20:.2f}    SMA{SMA_MID}：{vals.sma50:.2f}    SMA{SMA_LONG}：{vals.sma200:.2f}")
+    print(f"📉 RSI{RSI_PERIOD}：{vals.rsi:.2f}（前：{vals.rsi_prev:.2f}）")
+    print(f"📈 MACD：{vals.macd:.4f}    SIG：{vals.macd_sig:.4f}    HIST：{vals.macd_hist:.6f}")
+    print("-------------------------------------------------------")
+    print(f"📅 最近 {PULLBACK_NDAYS} 日高點：{vals.recent_high:.2f}    低點：{vals.recent_low:.2f}")
+    print(f"🔻 距離最近高點跌幅：{vals.drop_from_high_pct:.2f}%")
+    print("=======================================================")
+    print("🔎 判斷結果（Balanced preset）：")
+    print(" ➤ 是否為合格拉回買：", "✅ ✅ ✅ 合格（可考慮分批進場）" if result["entry"] else "❌ ❌ ❌ 不建議拉回買（不符條件）")
+    print("\n📝 觸發/檢核細項：")
+    for r in result["reasons"]:
+        # reasons 是 (樣板, 參數) 延後格式化；相容舊快取裡的純字串
+        print("  -", r if isinstance(r, str) else r[0].format(*r[1]))
+    print("\n🎯 建議進場計畫（僅供參考）：")
+    if plan.buy_zone is not None:
+        lo, hi = plan.buy_zone
+        print(f"  🟢 建議分批買入區間（保守參考）：{lo:.2f} ~ {hi:.2f}")
+    if plan.buy_break is not None:
+        print(f"  🔵 或等突破買進（突破當日高點）：{plan.buy_break:.2f}")
+    if plan.stop_loss is not None:
+        print(f"  🛑 建議停損：{plan.stop_loss:.2f}（最近 {PULLBACK_NDAYS} 日低點下方 {plan.sl_buffer_pct*100:.2f}%）")
+    print("-------------------------------------------------------")
+    print("💡 小建議：首次進場建議分批（例如 40% / 30% / 30%），回彈放量再加碼。")
+    print("=======================================================")
+
+# -------- Result memoization (per ticker / last bar / parameters) --------
+def _result_cache_path(ticker: str, last_bar: str, days: int):
+    key = "|".join(str(v) for v in (
+        ticker, last_bar, days, PULLBACK_NDAYS, PULLBACK_PCT,
+        VOL_MIN_RATIO_ENTRY, VOL_MIN_RATIO_CONFIRM, RSI_PERIOD,
+        SMA_SHORT, SMA_MID, SMA_LONG, VOL_SMA))
+    return os.path.join(CACHE_DIR, f"res_{hashlib.md5(key.encode()).hexdigest()}.pkl")
+
+def _load_result(path: str):
+    try:
+        # 只信今天寫的結果；參數改動已反映在檔名 key 裡
+        if datetime.fromtimestamp(os.path.getmtime(path)).date() != datetime.now().date():
+            return None
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+        # 舊版把 values 存成 dict；格式不合就當快取失效重算
+        if not isinstance(result.get("values"), Values):
+            return None
+        return result
+    except Exception:
+        return None
+
+def _save_result(path: str, result):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(result, f)
+    except Exception:
+        pass
+
+# -------- Screener over many tickers --------
+def decision_batch(close, low, high, vol, sma20, sma50, sma200,
+                   rsi, rsi_prev, macd, macd_sig, macd_hist, hist_prev,
+                   vol20, recent_high, recent_low):
+    """向量化版的拉回判斷：每個參數都是跨 T 檔標的的 (T,) 陣列。
+
+    條件與 decision_pullback_balanced 的 flags 逐位元一致（NaN 在
+    numpy 比較下自然得 False，對應單檔版的 isnan 防呆），整批標的
+    一次用布林運算算完，不必逐檔進 Python 迴圈。回傳各 flag 陣列
+    與最終 entry 陣列的 dict。
+    """
+    trend_ok = (sma50 > sma200) & (close > sma50)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drop_from_high = np.where(recent_high > 0, (recent_high - low) / recent_high, 0.0)
+    pullback_by_sma20 = low <= sma20
+    pullback_by_pct = drop_from_high >= PULLBACK_PCT
+    rsi_ok = (((rsi >= 30) & (rsi <= 50) & (rsi > rsi_prev))
+              | ((rsi_prev < 30) & (rsi >= 30))
+              | ((rsi_prev < 40) & (rsi >= 40)))
+    macd_ok = ((macd_hist > hist_prev) & (macd_hist > 0)) | (macd > macd_sig)
+    vol_entry_ok = vol >= VOL_MIN_RATIO_ENTRY * vol20
+    vol_confirm_ok = vol >= VOL_MIN_RATIO_CONFIRM * vol20
+    entry = (trend_ok & (pullback_by_sma20 | pullback_by_pct)
+             & (rsi_ok | macd_ok) & vol_entry_ok)
+    return {
+        "trend_ok": trend_ok,
+        "pullback_by_sma20": pullback_by_sma20,
+        "pullback_by_pct": pullback_by_pct,
+        "drop_from_high": drop_from_high,
+        "rsi_ok": rsi_ok,
+        "macd_ok": macd_ok,
+        "vol_entry_ok": vol_entry_ok,
+        "vol_confirm_ok": vol_confirm_ok,
+        "entry": entry,
+    }
+
+def screen_tickers(tickers, days: int = 400):
+    """對一串代號跑同一套拉回判斷，逐檔印一行摘要。"""
+    frames = fetch_data_many(tickers, days)
+    min_rows = max(SMA_LONG, RSI_PERIOD, VOL_SMA, PULLBACK_NDAYS) + 5
+    print(f"🕒 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}  掃描 {len(tickers)} 檔（Balanced preset）")
+    # 先把每檔的末根 K 棒堆成 (T,) 陣列，判斷交給 decision_batch 一次算完
+    ok, rows = [], []
+    for t in tickers:
+        df = frames.get(t)
+        if df is None or df.shape[0] < min_rows:
+            print(f"  ⚠️ {t}: 資料不足或抓取失敗，跳過")
+            continue
+        df = prepare_df(df)
+        ok.append(t)
+        rows.append([float(df[c].to_numpy()[i]) for c, i in (
+            ('Close', -1), ('Low', -1), ('High', -1), ('Volume', -1),
+            (f"SMA{SMA_SHORT}", -1), (f"SMA{SMA_MID}", -1), (f"SMA{SMA_LONG}", -1),
+            (f"RSI{RSI_PERIOD}", -1), (f"RSI{RSI_PERIOD}", -2),
+            ("MACD", -1), ("MACD_SIG", -1), ("MACD_HIST", -1), ("MACD_HIST", -2),
+            ("VOL_SMA", -1), ("RECENT_HIGH", -1), ("RECENT_LOW", -1))])
+    if not ok:
+        return
+    cols = np.asarray(rows, dtype=np.float64).T
+    batch = decision_batch(*cols)
+    for i, t in enumerate(ok):
+        mark = "✅ 合格拉回" if batch["entry"][i] else "❌ 不符"
+        print(f"  {mark}  {t}: Close {cols[0][i]:.2f}  RSI {cols[7][i]:.2f}  "
+              f"跌幅 {batch['drop_from_high'][i]*100:.2f}%")
+
+# -------- Main --------
+def main():
+    parser = argparse.ArgumentParser(description="PullBackInTW (Balanced preset)")
+    parser.add_argument("--ticker", type=str, default="2317.TW", help="Ticker (e.g., 2317.TW or NVDA)")
+    parser.add_argument("--tickers", type=str, default=None,
+                        help="逗號分隔的多檔掃描，例如 2317.TW,2330.TW（與 --ticker 擇一）")
+    parser.add_argument("--days", type=int, default=400, help="Days history to fetch")
+    args = parser.parse_args()
+
+    if args.tickers:
+        screen_tickers([t.strip() for t in args.tickers.split(",") if t.strip()], args.days)
+        return
+
+    ticker = args.ticker
+    days = args.days
+
+    # 名稱查詢可能也要打 HTTP（yfinance .info），丟到背景執行緒
+    # 與價格抓取的網路等待重疊，結束前再收結果。
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        name_future = executor.submit(get_company_name, ticker)
+        df = fetch_data(ticker, days)
+        # 同一根末 K 棒 + 同一組參數的判斷結果今天算過就直接重用
+        res_path = _result_cache_path(ticker, df.index[-1].strftime('%Y-%m-%d'), days)
+        result = _load_result(res_path)
+        if result is None:
+            df = prepare_df(df)
+            if df.shape[0] < max(SMA_LONG, RSI_PERIOD, VOL_SMA, PULLBACK_NDAYS) + 5:
+                raise RuntimeError("資料筆數不足，請增加 days 或確認資料來源。")
+
+            result = decision_pullback_balanced(df)
+            _save_result(res_path, result)
+        try:
+            company_name = name_future.result(timeout=2)
+        except Exception:
+            company_name = ticker
+    pretty_print(result, ticker, company_name)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print("執行發生錯誤：", e)
+        print("檢查：是否安裝 yfinance/pandas/numpy (twstock 可選)、或 ticker 格式是否正確（TW 市場加 .TW）")
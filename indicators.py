@@ -0,0 +1,411 @@
+"""
+indicators.py — PullBackIn.py 與 main.py 共用的指標核心與資料抓取
+
+兩支腳本原本各養一份 fetch_data / calc_sma / RSI / MACD，優化得改兩次、
+模組層的快取也不互通；集中到這裡之後 kernel（含 numba JIT 的磁碟快取）
+與同行程內的抓取結果都只有一份。helper 一律吃 ndarray、回 ndarray。
+"""
+
+import functools
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# -------- Indicator calculations (Wilder RSI = EWM with alpha=1/n) --------
+# numba 為選配：有裝時用單迴圈 JIT 核心一次算完 RSI/MACD，沒裝時退回 pandas。
+# 所有核心都掛 cache=True：編譯結果落在 __pycache__，只有第一次執行付
+# JIT 成本，之後的 CLI 啟動直接載入機器碼（numba.pycc 的 AOT 已被上游
+# 棄用，磁碟快取是目前建議的做法）。
+try:
+    from numba import njit
+except Exception:
+    njit = None
+
+# scipy 也是選配：lfilter 的 C 實作跑遞迴濾波比純 numpy 閉式解快
+try:
+    from scipy.signal import lfilter
+except Exception:
+    lfilter = None
+
+# bottleneck 的 move_mean 是移動總和的 C 實作，比 cumsum 差分再省一次配置
+try:
+    import bottleneck as bn
+except Exception:
+    bn = None
+
+@functools.lru_cache(maxsize=32)
+def _ewm_weights(alpha: float, n: int):
+    """幾何權重向量 r^1..r^n。α 與資料長度固定（14/12/26/9、尾段長度），
+    算一次就重複使用，省掉每次呼叫的 arange + power。"""
+    return np.power(1.0 - alpha, np.arange(1, n + 1))
+
+def _ewm_np(x: np.ndarray, alpha: float, s0: float):
+    """閉式幾何權重版 EWM：回傳 s_1..s_n，s_t = (1-α)s_{t-1} + αx_t。
+
+    把遞迴展開成 s_t = r^t (s_0 + α Σ x_k r^{-k})，整段用一次 cumsum
+    向量化算完，不需逐元素迴圈。r^{-k} 在這裡的資料長度（數百筆）
+    不會溢位。有 scipy 時改走 lfilter（IIR 濾波的 C 實作，同一條
+    遞迴式，zi 設成 (1-α)s_0 即等價於 pandas 的 adjust=False）。
+    """
+    r = 1.0 - alpha
+    if lfilter is not None:
+        y, _ = lfilter([alpha], [1.0, -r], x, zi=[r * s0])
+        return y
+    p = _ewm_weights(alpha, x.shape[0])
+    return p * (s0 + alpha * np.cumsum(x / p))
+
+def _rsi_np(close: np.ndarray, n: int):
+    """向量化 Wilder RSI：diff/clip 改成一趟 numpy 減法 + maximum。"""
+    d = np.empty_like(close)
+    d[0] = 0.0
+    np.subtract(close[1:], close[:-1], out=d[1:])
+    gain = np.maximum(d[1:], 0.0)
+    loss = np.maximum(-d[1:], 0.0)
+    a = 1.0 / n
+    avg_gain = np.concatenate(([gain[0]], _ewm_np(gain[1:], a, gain[0])))
+    avg_loss = np.concatenate(([loss[0]], _ewm_np(loss[1:], a, loss[0])))
+    rsi = np.empty_like(close)
+    rsi[0] = 50.0
+    # 直接除、用 errstate 靜音除零，省掉先把 0 換成 NaN 的那次
+    # 全陣列配置；avg_loss=0 的位置事後一樣補中性 50
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+        rsi[1:] = np.where(avg_loss == 0.0, 50.0, 100.0 - 100.0 / (1.0 + rs))
+    return rsi
+
+def _indicators_np(close, n_rsi, fast, slow, sig):
+    """無 numba 時的向量化後備：與 _indicators_loop 同輸出。"""
+    rsi = _rsi_np(close, n_rsi)
+    macd, macd_sig, macd_hist = calc_macd(close, fast, slow, sig)
+    return rsi, macd, macd_sig, macd_hist
+
+def _indicators_loop(close, n_rsi, fast, slow, sig):
+    """單趟掃過 close，同步遞推 avg_gain/avg_loss 與三條 EMA。
+
+    回傳 (rsi, macd, macd_sig, macd_hist)，數值與 pandas
+    ewm(adjust=False) 的結果一致（RSI 初期 avg_loss=0 時同樣填 50）。
+    """
+    n = close.shape[0]
+    rsi = np.empty(n)
+    macd = np.empty(n)
+    macd_sig = np.empty(n)
+    macd_hist = np.empty(n)
+
+    a_rsi = 1.0 / n_rsi
+    a_fast = 2.0 / (fast + 1)
+    a_slow = 2.0 / (slow + 1)
+    a_sig = 2.0 / (sig + 1)
+
+    ema_fast = close[0]
+    ema_slow = close[0]
+    sig_ema = 0.0
+    avg_gain = 0.0
+    avg_loss = 0.0
+
+    rsi[0] = 50.0
+    macd[0] = 0.0
+    macd_sig[0] = 0.0
+    macd_hist[0] = 0.0
+
+    for i in range(1, n):
+        d = close[i] - close[i - 1]
+        gain = d if d > 0.0 else 0.0
+        loss = -d if d < 0.0 else 0.0
+        if i == 1:
+            avg_gain = gain
+            avg_loss = loss
+        else:
+            avg_gain += a_rsi * (gain - avg_gain)
+            avg_loss += a_rsi * (loss - avg_loss)
+        if avg_loss == 0.0:
+            rsi[i] = 50.0
+        else:
+            rsi[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+        ema_fast += a_fast * (close[i] - ema_fast)
+        ema_slow += a_slow * (close[i] - ema_slow)
+        m = ema_fast - ema_slow
+        sig_ema += a_sig * (m - sig_ema)
+        macd[i] = m
+        macd_sig[i] = sig_ema
+        macd_hist[i] = m - sig_ema
+
+    return rsi, macd, macd_sig, macd_hist
+
+if njit is not None:
+    _indicators_kernel = njit(cache=True, fastmath=True)(_indicators_loop)
+else:
+    _indicators_kernel = _indicators_np
+
+def _compute_all_loop(close, volume, n_s, n_m, n_l, vol_n, rsi_n, fast, slow, sig):
+    """prepare_df 的全指標單趟核心：SMA 用移動總和（每步一加一減），
+    RSI/MACD 沿用 _indicators_loop 的遞推，八個欄位一次掃完。"""
+    n = close.shape[0]
+    sma_s = np.full(n, np.nan)
+    sma_m = np.full(n, np.nan)
+    sma_l = np.full(n, np.nan)
+    vol_sma = np.full(n, np.nan)
+    rsi = np.empty(n)
+    macd = np.empty(n)
+    macd_sig = np.empty(n)
+    macd_hist = np.empty(n)
+
+    a_rsi = 1.0 / rsi_n
+    a_fast = 2.0 / (fast + 1)
+    a_slow = 2.0 / (slow + 1)
+    a_sig = 2.0 / (sig + 1)
+
+    sum_s = 0.0
+    sum_m = 0.0
+    sum_l = 0.0
+    sum_v = 0.0
+    ema_fast = close[0]
+    ema_slow = close[0]
+    sig_ema = 0.0
+    avg_gain = 0.0
+    avg_loss = 0.0
+
+    rsi[0] = 50.0
+    macd[0] = 0.0
+    macd_sig[0] = 0.0
+    macd_hist[0] = 0.0
+
+    for i in range(n):
+        c = close[i]
+        sum_s += c
+        sum_m += c
+        sum_l += c
+        sum_v += volume[i]
+        if i >= n_s:
+            sum_s -= close[i - n_s]
+        if i >= n_m:
+            sum_m -= close[i - n_m]
+        if i >= n_l:
+            sum_l -= close[i - n_l]
+        if i >= vol_n:
+            sum_v -= volume[i - vol_n]
+        if i >= n_s - 1:
+            sma_s[i] = sum_s / n_s
+        if i >= n_m - 1:
+            sma_m[i] = sum_m / n_m
+        if i >= n_l - 1:
+            sma_l[i] = sum_l / n_l
+        if i >= vol_n - 1:
+            vol_sma[i] = sum_v / vol_n
+
+        if i == 0:
+            continue
+        d = c - close[i - 1]
+        gain = d if d > 0.0 else 0.0
+        loss = -d if d < 0.0 else 0.0
+        if i == 1:
+            avg_gain = gain
+            avg_loss = loss
+        else:
+            avg_gain += a_rsi * (gain - avg_gain)
+            avg_loss += a_rsi * (loss - avg_loss)
+        if avg_loss == 0.0:
+            rsi[i] = 50.0
+        else:
+            rsi[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+        ema_fast += a_fast * (c - ema_fast)
+        ema_slow += a_slow * (c - ema_slow)
+        m = ema_fast - ema_slow
+        sig_ema += a_sig * (m - sig_ema)
+        macd[i] = m
+        macd_sig[i] = sig_ema
+        macd_hist[i] = m - sig_ema
+
+    return sma_s, sma_m, sma_l, vol_sma, rsi, macd, macd_sig, macd_hist
+
+# 只有 JIT 版划得來；無 numba 時 prepare_df 走向量化 numpy 路徑
+_compute_all = njit(cache=True, fastmath=True)(_compute_all_loop) if njit is not None else None
+
+def _rolling_max_loop(arr, w):
+    """單調雙端佇列版 rolling max：整段 O(N)，與視窗大小無關。
+
+    佇列存候選索引，新值從尾端擠掉較小者、頭端淘汰出窗者；
+    逐根 K 棒回測時比每步重算 O(W) 的 max 快得多。
+    """
+    n = arr.shape[0]
+    out = np.full(n, np.nan)
+    idx = np.empty(n, dtype=np.int64)
+    head = 0
+    tail = 0
+    for i in range(n):
+        while tail > head and arr[idx[tail - 1]] <= arr[i]:
+            tail -= 1
+        idx[tail] = i
+        tail += 1
+        if idx[head] <= i - w:
+            head += 1
+        if i >= w - 1:
+            out[i] = arr[idx[head]]
+    return out
+
+_rolling_max_kernel = njit(cache=True)(_rolling_max_loop) if njit is not None else None
+
+def rolling_max(arr: np.ndarray, w: int):
+    if _rolling_max_kernel is not None:
+        return _rolling_max_kernel(np.asarray(arr, dtype=np.float64), w)
+    out = np.full(arr.shape[0], np.nan)
+    if arr.shape[0] >= w:
+        out[w - 1:] = np.lib.stride_tricks.sliding_window_view(arr, w).max(axis=1)
+    return out
+
+def rolling_min(arr: np.ndarray, w: int):
+    return -rolling_max(-np.asarray(arr, dtype=np.float64), w)
+
+def _sma_multi(arr: np.ndarray, windows):
+    """用一次 cumsum 算出多個視窗的 SMA（前 n-1 筆補 NaN 對齊）。
+
+    有 bottleneck 時改走 move_mean（C 實作、同樣的 NaN 前置對齊）。
+    """
+    if bn is not None:
+        arr64 = np.asarray(arr, dtype=np.float64)
+        return [bn.move_mean(arr64, window=n, min_count=n) for n in windows]
+    cs = np.concatenate(([0.0], np.cumsum(arr, dtype=np.float64)))
+    out = []
+    for n in windows:
+        s = np.full(arr.shape[0], np.nan)
+        if arr.shape[0] >= n:
+            s[n - 1:] = (cs[n:] - cs[:-n]) / n
+        out.append(s)
+    return out
+
+# 指標 helper 一律吃 ndarray、回 ndarray；呼叫端在 prepare_df 取一次
+# 底層陣列即可，省掉每個 helper 內部的 Series 建構/收尾成本。
+def calc_sma(close: np.ndarray, n: int):
+    return _sma_multi(np.asarray(close, dtype=np.float64), (n,))[0]
+
+def calc_rsi_wilder(close: np.ndarray, n: int = 14):
+    return _rsi_np(np.asarray(close, dtype=np.float64), n)
+
+def _macd_loop(close, fast, slow, sig):
+    """單趟融合版 MACD：一個迴圈同時遞推三條 EMA。
+
+    三條遞迴各自展開要掃三遍陣列、配置三份中間結果；融合後
+    ema_fast/ema_slow/sig_ema 三個純量在同一趟更新，hist 順手算完。
+    """
+    n = close.shape[0]
+    macd = np.empty(n)
+    macd_sig = np.empty(n)
+    macd_hist = np.empty(n)
+    a_fast = 2.0 / (fast + 1)
+    a_slow = 2.0 / (slow + 1)
+    a_sig = 2.0 / (sig + 1)
+    ema_fast = close[0]
+    ema_slow = close[0]
+    sig_ema = 0.0
+    macd[0] = 0.0
+    macd_sig[0] = 0.0
+    macd_hist[0] = 0.0
+    for i in range(1, n):
+        ema_fast += a_fast * (close[i] - ema_fast)
+        ema_slow += a_slow * (close[i] - ema_slow)
+        m = ema_fast - ema_slow
+        sig_ema += a_sig * (m - sig_ema)
+        macd[i] = m
+        macd_sig[i] = sig_ema
+        macd_hist[i] = m - sig_ema
+    return macd, macd_sig, macd_hist
+
+_macd_kernel = njit(cache=True, fastmath=True)(_macd_loop) if njit is not None else None
+
+def calc_macd(close: np.ndarray, fast=12, slow=26, signal=9):
+    close = np.asarray(close, dtype=np.float64)
+    if _macd_kernel is not None:
+        return _macd_kernel(close, fast, slow, signal)
+    ema_fast = np.concatenate(([close[0]], _ewm_np(close[1:], 2.0 / (fast + 1), close[0])))
+    ema_slow = np.concatenate(([close[0]], _ewm_np(close[1:], 2.0 / (slow + 1), close[0])))
+    macd = ema_fast - ema_slow
+    macd_sig = np.concatenate(([macd[0]], _ewm_np(macd[1:], 2.0 / (signal + 1), macd[0])))
+    return macd, macd_sig, macd - macd_sig
+
+# -------- Data fetch and prepare --------
+CACHE_DIR = os.path.expanduser("~/.cache/pullback")
+
+def _cache_path(ticker: str):
+    return os.path.join(CACHE_DIR, f"{ticker.replace('/', '_')}.parquet")
+
+def _read_cache(ticker: str):
+    try:
+        return pd.read_parquet(_cache_path(ticker))
+    except Exception:
+        return None
+
+def _write_cache(ticker: str, df: pd.DataFrame):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(_cache_path(ticker), compression='zstd')
+    except Exception:
+        pass  # 快取寫入失敗不影響主流程
+
+def _fetch_remote(ticker: str, days: int = None, start=None):
+    import yfinance as yf
+    tk = yf.Ticker(ticker)
+    if start is not None:
+        df = tk.history(start=start, interval="1d", auto_adjust=False)
+    else:
+        df = tk.history(period=f"{days}d", interval="1d", auto_adjust=False)
+    return df
+
+@functools.lru_cache(maxsize=8)
+def _fetch_data_cached(ticker: str, days: int, today: str):
+    # 先讀本地快取：同一交易日內重跑不需再打網路；
+    # 快取過期時只抓缺少的尾段（增量更新），再併回快取。
+    cached = _read_cache(ticker)
+    if cached is not None and len(cached) >= days:
+        last_date = cached.index.max().date()
+        if last_date >= datetime.now().date():
+            return cached.tail(days)
+        try:
+            tail = _fetch_remote(ticker, start=last_date)
+            if tail is not None and not tail.empty:
+                tail = tail[['High', 'Low', 'Close', 'Volume']].dropna()
+                cached = pd.concat([cached, tail])
+                cached = cached[~cached.index.duplicated(keep='last')]
+            _write_cache(ticker, cached)
+            return cached.tail(days)
+        except Exception:
+            pass  # 增量更新失敗 → 退回完整抓取
+
+    # Use yfinance history; auto_adjust=False to use raw prices
+    df = _fetch_remote(ticker, days=days)
+    if df is None or df.empty:
+        raise RuntimeError(f"取得 {ticker} 資料失敗，請確認代號或網路。")
+    df = df[['High', 'Low', 'Close', 'Volume']].dropna()
+    # yfinance 回傳的已是 DatetimeIndex，不需再逐元素轉一次
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.to_datetime(df.index)
+    _write_cache(ticker, df)
+    return df
+
+def fetch_data(ticker: str, days: int = 400):
+    # 同一行程內同一天重複要同一檔資料時直接回用（key 帶上日期，
+    # 跨日自動失效）；跨行程的重用交給上面的 parquet 快取。
+    return _fetch_data_cached(ticker, days, datetime.now().strftime('%Y-%m-%d'))
+
+def fetch_data_many(tickers, days: int = 400):
+    """一次抓多檔：yf.download 內建執行緒平行，比逐檔 history 快 N 倍。
+
+    回傳 {ticker: DataFrame}，抓不到資料的代號直接略過。
+    """
+    import yfinance as yf
+    data = yf.download(list(tickers), period=f"{days}d", interval="1d",
+                       group_by='ticker', threads=True, auto_adjust=False,
+                       progress=False)
+    if data is None or data.empty:
+        raise RuntimeError("取得多檔資料失敗，請確認代號或網路。")
+    out = {}
+    for t in tickers:
+        try:
+            df = data[t][['High', 'Low', 'Close', 'Volume']].dropna()
+        except Exception:
+            continue
+        if not df.empty:
+            out[t] = df
+    return out